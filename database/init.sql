@@ -77,7 +77,7 @@ CREATE INDEX idx_orders_hospital_status ON Orders(hospital_id, order_status);
 -- Logs all automated decisions made by the system
 -- ============================================
 CREATE TABLE DecisionLogs (
-    decision_id VARCHAR(100) PRIMARY KEY,
+    decision_id UUID PRIMARY KEY,
     event_id VARCHAR(100) REFERENCES StockEvents(event_id) ON DELETE SET NULL,
     order_id VARCHAR(100) REFERENCES Orders(order_id) ON DELETE SET NULL,
     decision_type decision_type NOT NULL,
@@ -104,7 +104,7 @@ CREATE INDEX idx_decision_logs_created ON DecisionLogs(created_at DESC);
 -- Logs all ESB (Enterprise Service Bus) messages
 -- ============================================
 CREATE TABLE ESBLogs (
-    log_id VARCHAR(100) PRIMARY KEY,
+    log_id UUID PRIMARY KEY,
     message_id VARCHAR(100) NOT NULL,
     source_hospital_id VARCHAR(50) NOT NULL,
     target_service VARCHAR(100) NOT NULL,
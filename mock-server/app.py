@@ -3,20 +3,24 @@ Mock SOAP Server for Hospital Supply Chain
 Flask-based mock server for StockUpdateService
 
 This server is for testing purposes for other teams.
-Run with: python app.py
+Run with: python app.py (served by waitress)
 """
 
 from flask import Flask, request, Response
-import xml.etree.ElementTree as ET
+from lxml import etree
 from datetime import datetime
-import uuid
+import io
+import json
+import re
+import secrets
+import time
 import logging
 
 app = Flask(__name__)
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=logging.WARNING,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -25,140 +29,215 @@ logger = logging.getLogger(__name__)
 SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
 TNS = "http://hospital-supply-chain.example.com/soap/stock"
 
+# StockUpdateRequest fields returned by parse_stock_update_request
+_FIELD_NAMES = (
+    'hospitalId',
+    'productCode',
+    'currentStockUnits',
+    'dailyConsumptionUnits',
+    'daysOfSupply',
+    'timestamp'
+)
 
-def create_soap_response(success: bool, message: str, order_triggered: bool = False, order_id: str = None) -> str:
-    """Create a SOAP response envelope."""
-    order_id_element = f"<tns:orderId>{order_id}</tns:orderId>" if order_id else "<tns:orderId/>"
+# iterparse tag filter: the request element plus its fields, in any namespace
+_REQUEST_TAG = 'StockUpdateRequest'
+_ITERPARSE_TAGS = ['{*}' + _REQUEST_TAG] + ['{*}' + name for name in _FIELD_NAMES]
 
-    response = f"""<?xml version="1.0" encoding="UTF-8"?>
+# Fast-path extractor for the only field the mock logic uses
+_DOS_RE = re.compile(rb'<[^:>]*:?daysOfSupply>\s*([0-9.]+)')
+
+# Precompiled SOAP envelopes (namespaces baked in at import), split into
+# static byte chunks around each dynamic field and joined per request
+_RESP_PARTS = f"""<?xml version="1.0" encoding="UTF-8"?>
 <soap:Envelope xmlns:soap="{SOAP_NS}" xmlns:tns="{TNS}">
     <soap:Body>
         <tns:StockUpdateResponse>
-            <tns:success>{str(success).lower()}</tns:success>
-            <tns:message>{message}</tns:message>
-            <tns:orderTriggered>{str(order_triggered).lower()}</tns:orderTriggered>
-            {order_id_element}
+            <tns:success>%s</tns:success>
+            <tns:message>%s</tns:message>
+            <tns:orderTriggered>%s</tns:orderTriggered>
+            %s
         </tns:StockUpdateResponse>
     </soap:Body>
-</soap:Envelope>"""
-    return response
-
+</soap:Envelope>""".encode('utf-8').split(b"%s")
 
-def create_soap_fault(error_code: str, error_message: str, hospital_id: str = None, product_code: str = None) -> str:
-    """Create a SOAP fault response."""
-    timestamp = datetime.utcnow().isoformat() + "Z"
-
-    fault = f"""<?xml version="1.0" encoding="UTF-8"?>
+_FAULT_PARTS = f"""<?xml version="1.0" encoding="UTF-8"?>
 <soap:Envelope xmlns:soap="{SOAP_NS}" xmlns:tns="{TNS}">
     <soap:Body>
         <soap:Fault>
             <faultcode>soap:Server</faultcode>
-            <faultstring>{error_message}</faultstring>
+            <faultstring>%s</faultstring>
             <detail>
                 <tns:StockUpdateFault>
-                    <tns:errorCode>{error_code}</tns:errorCode>
-                    <tns:errorMessage>{error_message}</tns:errorMessage>
-                    <tns:hospitalId>{hospital_id or 'N/A'}</tns:hospitalId>
-                    <tns:productCode>{product_code or 'N/A'}</tns:productCode>
-                    <tns:timestamp>{timestamp}</tns:timestamp>
+                    <tns:errorCode>%s</tns:errorCode>
+                    <tns:errorMessage>%s</tns:errorMessage>
+                    <tns:hospitalId>%s</tns:hospitalId>
+                    <tns:productCode>%s</tns:productCode>
+                    <tns:timestamp>%s</tns:timestamp>
                 </tns:StockUpdateFault>
             </detail>
         </soap:Fault>
     </soap:Body>
-</soap:Envelope>"""
-    return fault
+</soap:Envelope>""".encode('utf-8').split(b"%s")
 
+_ORDER_ID_OPEN = b"<tns:orderId>"
+_ORDER_ID_CLOSE = b"</tns:orderId>"
+_EMPTY_ORDER_ID = b"<tns:orderId/>"
+_XML_BOOL = {True: b"true", False: b"false"}
 
-def parse_stock_update_request(xml_data: str) -> dict:
-    """Parse the incoming SOAP request and extract StockUpdateRequest fields."""
-    try:
-        root = ET.fromstring(xml_data)
+# Pre-rendered bodies for the static GET endpoints (only the health timestamp varies)
+_WSDL_LOCATION = "See contracts/wsdl/StockUpdateService.wsdl for full WSDL"
+_WSDL_BODY = f"<!-- {_WSDL_LOCATION} -->\n<message>Use POST method with SOAP XML body</message>".encode('utf-8')
 
-        # Define namespaces for parsing
-        namespaces = {
-            'soap': SOAP_NS,
-            'tns': TNS
-        }
+_HEALTH_PREFIX = b'{"status":"healthy","service":"StockUpdateService-Mock","timestamp":"'
+_HEALTH_SUFFIX = b'Z"}'
 
-        # Find the StockUpdateRequest element
-        body = root.find('.//soap:Body', namespaces)
-        if body is None:
-            # Try without namespace prefix
-            body = root.find('.//{%s}Body' % SOAP_NS)
+# UTC ISO timestamp shared by every health/fault body rendered within the same second
+_TIMESTAMP_CACHE = (0, b"")
 
-        if body is None:
-            return None
+_INDEX_BODY = json.dumps({
+    "service": "Hospital Supply Chain - Mock SOAP Server",
+    "version": "1.0.0",
+    "endpoints": {
+        "StockUpdateService": "/StockUpdateService (POST - SOAP XML)",
+        "health": "/health (GET)",
+        "wsdl": "/StockUpdateService (GET)"
+    },
+    "documentation": "This is a mock server for testing purposes."
+}).encode('utf-8')
+
+
+def _utc_timestamp() -> bytes:
+    """Return the current UTC time as ISO-8601 bytes, refreshed at most once per second."""
+    global _TIMESTAMP_CACHE
+    now = int(time.time())
+    if _TIMESTAMP_CACHE[0] != now:
+        _TIMESTAMP_CACHE = (now, datetime.utcfromtimestamp(now).isoformat().encode('utf-8'))
+    return _TIMESTAMP_CACHE[1]
+
+
+def create_soap_response(success: bool, message: str, order_triggered: bool = False, order_id: str = None) -> bytes:
+    """Create a SOAP response envelope."""
+    if order_id:
+        order_id_element = b"".join((_ORDER_ID_OPEN, order_id.encode('utf-8'), _ORDER_ID_CLOSE))
+    else:
+        order_id_element = _EMPTY_ORDER_ID
+
+    r0, r1, r2, r3, r4 = _RESP_PARTS
+    return b"".join((
+        r0, _XML_BOOL[success],
+        r1, message.encode('utf-8'),
+        r2, _XML_BOOL[order_triggered],
+        r3, order_id_element,
+        r4
+    ))
+
+
+def create_soap_fault(error_code: str, error_message: str, hospital_id: str = None, product_code: str = None) -> bytes:
+    """Create a SOAP fault response."""
+    error_message = error_message.encode('utf-8')
 
-        # Try to find StockUpdateRequest with various namespace patterns
-        request_elem = None
-        for child in body:
-            if 'StockUpdateRequest' in child.tag:
-                request_elem = child
+    f0, f1, f2, f3, f4, f5, f6 = _FAULT_PARTS
+    return b"".join((
+        f0, error_message,
+        f1, error_code.encode('utf-8'),
+        f2, error_message,
+        f3, (hospital_id or 'N/A').encode('utf-8'),
+        f4, (product_code or 'N/A').encode('utf-8'),
+        f5, _utc_timestamp(), b"Z",
+        f6
+    ))
+
+
+def _is_stock_update_request(elem) -> bool:
+    """True for a StockUpdateRequest element that sits directly under a SOAP Body."""
+    if elem.tag.rpartition('}')[2] != _REQUEST_TAG:
+        return False
+    parent = elem.getparent()
+    return parent is not None and parent.tag.rpartition('}')[2] == 'Body'
+
+
+def parse_stock_update_request(xml_data: str) -> dict:
+    """Parse the incoming SOAP request and extract StockUpdateRequest fields."""
+    try:
+        # Stream 'end' events for the wanted tags only; stop as soon as the
+        # StockUpdateRequest element closes (or all fields are in) instead of
+        # building and walking the whole envelope tree.
+        fields = {}
+        request_seen = False
+        for _, elem in etree.iterparse(
+            io.BytesIO(xml_data.encode('utf-8')),
+            events=('end',),
+            tag=_ITERPARSE_TAGS,
+            huge_tree=False,
+            resolve_entities=False
+        ):
+            if _is_stock_update_request(elem):
+                request_seen = True
                 break
 
-        if request_elem is None:
-            return None
+            local_name = elem.tag.rpartition('}')[2]
+            parent = elem.getparent()
+            if parent is not None and _is_stock_update_request(parent):
+                fields.setdefault(local_name, elem.text)
+                elem.clear()
+                if len(fields) == len(_FIELD_NAMES):
+                    request_seen = True
+                    break
 
-        # Extract fields (handle both namespaced and non-namespaced)
-        def get_text(parent, tag_name):
-            for child in parent:
-                if tag_name in child.tag:
-                    return child.text
+        if not request_seen:
             return None
 
-        return {
-            'hospitalId': get_text(request_elem, 'hospitalId'),
-            'productCode': get_text(request_elem, 'productCode'),
-            'currentStockUnits': get_text(request_elem, 'currentStockUnits'),
-            'dailyConsumptionUnits': get_text(request_elem, 'dailyConsumptionUnits'),
-            'daysOfSupply': get_text(request_elem, 'daysOfSupply'),
-            'timestamp': get_text(request_elem, 'timestamp')
-        }
-
-    except ET.ParseError as e:
-        logger.error(f"XML Parse Error: {e}")
+        return {name: fields.get(name) for name in _FIELD_NAMES}
+
+    except etree.XMLSyntaxError as e:
+        logger.error("XML Parse Error: %s", e)
         return None
 
 
 @app.route('/StockUpdateService', methods=['POST'])
-def stock_update_service():
+def stock_update_service() -> Response:
     """
     Mock SOAP endpoint for StockUpdateService.
     Accepts XML POST requests and returns hardcoded success response.
     """
-    content_type = request.headers.get('Content-Type', '')
-
-    # Validate content type
-    if 'xml' not in content_type.lower() and 'text' not in content_type.lower():
-        logger.warning(f"Invalid content type received: {content_type}")
-        # Still try to process it
-
-    xml_data = request.data.decode('utf-8')
-    logger.info(f"Received request:\n{xml_data[:500]}...")  # Log first 500 chars
-
-    # Parse the request
-    parsed_request = parse_stock_update_request(xml_data)
-
-    if parsed_request is None:
-        logger.error("Failed to parse SOAP request")
-        fault_response = create_soap_fault(
-            error_code="PARSE_ERROR",
-            error_message="Could not parse SOAP request"
-        )
-        return Response(fault_response, status=400, mimetype='text/xml')
-
-    logger.info(f"Parsed request: {parsed_request}")
+    # Content-Type is not checked: any body is processed as SOAP XML
+    raw_data = request.data
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received request: %d bytes", len(raw_data))
+
+    # Fast path: the mock only needs daysOfSupply, so read it straight from the bytes.
+    # ?strict=1 (or a regex miss) falls back to the full SOAP parse for contract testing.
+    strict = request.args.get('strict') == '1'
+    match = None if strict else _DOS_RE.search(raw_data)
+
+    if match is not None:
+        days_of_supply_text = match.group(1)
+    else:
+        # Parse the request
+        parsed_request = parse_stock_update_request(raw_data.decode('utf-8'))
+
+        if parsed_request is None:
+            logger.error("Failed to parse SOAP request")
+            fault_response = create_soap_fault(
+                error_code="PARSE_ERROR",
+                error_message="Could not parse SOAP request"
+            )
+            return Response(fault_response, status=400, mimetype='text/xml')
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed request: %s", parsed_request)
+        days_of_supply_text = parsed_request.get('daysOfSupply', 999)
 
     # Check if we should trigger an order (mock logic: if daysOfSupply < 7)
     order_triggered = False
     order_id = None
 
     try:
-        days_of_supply = float(parsed_request.get('daysOfSupply', 999))
+        days_of_supply = float(days_of_supply_text)
         if days_of_supply < 7:
             order_triggered = True
-            order_id = f"ORD-MOCK-{uuid.uuid4().hex[:8].upper()}"
-            logger.info(f"Mock order triggered: {order_id}")
+            order_id = f"ORD-MOCK-{secrets.token_hex(4).upper()}"
+            logger.info("Mock order triggered: %s", order_id)
     except (ValueError, TypeError):
         pass
 
@@ -170,45 +249,28 @@ def stock_update_service():
         order_id=order_id
     )
 
-    logger.info(f"Sending response:\n{response_xml}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sending response:\n%s", response_xml.decode('utf-8'))
 
     return Response(response_xml, status=200, mimetype='text/xml')
 
 
 @app.route('/StockUpdateService', methods=['GET'])
-def stock_update_service_wsdl():
+def stock_update_service_wsdl() -> Response:
     """Return WSDL for the service (simplified)."""
-    wsdl_location = "See contracts/wsdl/StockUpdateService.wsdl for full WSDL"
-    return Response(
-        f"<!-- {wsdl_location} -->\n<message>Use POST method with SOAP XML body</message>",
-        status=200,
-        mimetype='text/xml'
-    )
+    return Response(_WSDL_BODY, status=200, mimetype='text/xml')
 
 
 @app.route('/health', methods=['GET'])
-def health_check():
+def health_check() -> Response:
     """Health check endpoint."""
-    return {
-        "status": "healthy",
-        "service": "StockUpdateService-Mock",
-        "timestamp": datetime.utcnow().isoformat() + "Z"
-    }
+    return Response(b"".join((_HEALTH_PREFIX, _utc_timestamp(), _HEALTH_SUFFIX)), mimetype='application/json')
 
 
 @app.route('/', methods=['GET'])
-def index():
+def index() -> Response:
     """Root endpoint with service info."""
-    return {
-        "service": "Hospital Supply Chain - Mock SOAP Server",
-        "version": "1.0.0",
-        "endpoints": {
-            "StockUpdateService": "/StockUpdateService (POST - SOAP XML)",
-            "health": "/health (GET)",
-            "wsdl": "/StockUpdateService (GET)"
-        },
-        "documentation": "This is a mock server for testing purposes."
-    }
+    return Response(_INDEX_BODY, mimetype='application/json')
 
 
 if __name__ == '__main__':
@@ -221,4 +283,7 @@ if __name__ == '__main__':
     print("  GET  /health             - Health check")
     print("  GET  /                   - Service info")
     print("=" * 60)
-    app.run(host='0.0.0.0', port=5000, debug=True)
+
+    # Production WSGI server (the Werkzeug debug server is single-threaded)
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=5000, threads=16)
@@ -1,12 +1,42 @@
-import logging
 import json
+import logging
+import msgspec
+import orjson
 import os
 import datetime
 import azure.functions as func
 import pg8000.native
 import ssl
-import uuid
-from typing import List
+import secrets
+from typing import List, Optional
+
+# ============================================
+# InventoryLowEvent (msgspec ile tipli decode)
+# ============================================
+class InventoryLowEvent(msgspec.Struct):
+    """Gelen event gövdesi; eksik alanlar eski .get() varsayılanlarını alır."""
+    eventId: Optional[str] = None
+    hospitalId: Optional[str] = None
+    productCode: Optional[str] = None
+    # Adet alanları float okunup main() içinde int()'e çevrilir: 40.5 eskisi gibi 40 olur
+    currentStockUnits: float = 0
+    dailyConsumptionUnits: float = 1
+    daysOfSupply: float = 99.0
+
+
+# strict=False: "40" gibi string sayılar da float'a çevrilir
+_EVENT_DECODER = msgspec.json.Decoder(InventoryLowEvent, strict=False)
+
+
+def _decode_event(body: bytes) -> InventoryLowEvent:
+    try:
+        return _EVENT_DECODER.decode(body)
+    except msgspec.ValidationError:
+        raise
+    except msgspec.DecodeError:
+        # msgspec JSON'da Infinity/NaN yok; event_producer_sim tüketim 0 iken
+        # daysOfSupply=Infinity gönderir. Eski json.loads yoluna düş
+        return msgspec.convert(json.loads(body), InventoryLowEvent, strict=False)
 
 # ============================================
 # Decision Engine (SOAP ile Aynı Mantık)
@@ -48,115 +78,188 @@ class DecisionEngine:
         return result
 
 
-def main(events: List[func.EventHubEvent], outputEvent: func.Out[str]):
-    logging.info('>>> SERVERLESS PROCESSOR (FULL MODE) BAŞLADI <<<')
-    
-    # DB Bağlantısı Hazırlığı
-    db_host = os.environ.get("DB_HOST")
-    db_password = os.environ.get("DB_PASSWORD")
-    conn = None
-    
+# ============================================
+# DB Bağlantısı (modül seviyesinde önbellek)
+# ============================================
+# Functions host worker'ı sıcak tuttuğu için bağlantı invocation'lar arası
+# yeniden kullanılır; SSL/TCP/auth maliyeti yalnızca ilk çağrıda ödenir.
+_SSL_CONTEXT = None
+_CONN = None
+
+# Bağlantı üzerinde hazırlanmış (PREPARE edilmiş) INSERT'ler, SQL metnine göre.
+# conn.run her çağrıda PARSE + DESCRIBE + EXECUTE (3 round-trip) yapar; hazır
+# statement yalnızca BIND/EXECUTE yapar. Satır sayısı SQL'in parçası olduğundan
+# farklı sayfa boyları ayrı girdi olur; eski girdiler sınırda kapatılır.
+_PREPARED = {}
+PREPARED_CACHE_SIZE = 64
+
+
+def _connect():
+    global _SSL_CONTEXT
+    if _SSL_CONTEXT is None:
+        _SSL_CONTEXT = ssl.create_default_context()
+    return pg8000.native.Connection(
+        user=os.environ.get("DB_USER"),
+        password=os.environ.get("DB_PASSWORD"),
+        host=os.environ.get("DB_HOST"),
+        database=os.environ.get("DB_NAME"),
+        ssl_context=_SSL_CONTEXT
+    )
+
+
+def _get_conn():
+    """Önbellekteki bağlantıyı döner; kopmuşsa yeniden bağlanır. Hata halinde None."""
+    global _CONN
+    if _CONN is not None:
+        try:
+            _CONN.run("SELECT 1")
+            return _CONN
+        except Exception:
+            try:
+                _CONN.close()
+            except Exception:
+                pass
+            _CONN = None
+            _PREPARED.clear()
+
     try:
-        ssl_context = ssl.create_default_context()
-        conn = pg8000.native.Connection(
-            user=os.environ.get("DB_USER"),
-            password=db_password,
-            host=db_host,
-            database=os.environ.get("DB_NAME"),
-            ssl_context=ssl_context
-        )
+        _CONN = _connect()
     except Exception as e:
-        logging.error(f"DB Bağlantı Hatası: {str(e)}")
+        logging.error("DB Bağlantı Hatası: %s", e)
+        _CONN = None
+    return _CONN
+
+
+# Tek bir INSERT'e konacak en fazla satır sayısı (PostgreSQL parametre limiti için)
+BULK_INSERT_PAGE_SIZE = 500
+
+
+def _bulk_insert(conn, sql_prefix: str, row_template: str, rows: List[dict], sql_suffix: str = ""):
+    """
+    Satırları per-event conn.run yerine çok satırlı tek bir INSERT ile yazar.
+    row_template içindeki {i} satır indeksiyle değiştirilir (ör. ":eid{i}").
+    Bir sayfa hata verirse o sayfanın satırları tek tek yazılır; böylece hatalı
+    satır yalnızca kendi event'ini düşürür (eski per-event davranış).
+    """
+    for offset in range(0, len(rows), BULK_INSERT_PAGE_SIZE):
+        page = rows[offset:offset + BULK_INSERT_PAGE_SIZE]
+        try:
+            _run_page(conn, sql_prefix, row_template, page, sql_suffix)
+        except Exception as page_err:
+            if len(page) == 1:
+                raise
+            logging.warning("Toplu insert hatası, satır satır deneniyor: %s", page_err)
+            for row in page:
+                try:
+                    _run_page(conn, sql_prefix, row_template, [row], sql_suffix)
+                except Exception as row_err:
+                    logging.warning("Satır insert hatası: %s", row_err)
+
+
+def _run_page(conn, sql_prefix: str, row_template: str, page: List[dict], sql_suffix: str):
+    values = []
+    params = {}
+    for i, row in enumerate(page):
+        values.append(row_template.format(i=i))
+        for key, value in row.items():
+            params[f"{key}{i}"] = value
+    _prepared(conn, sql_prefix + ", ".join(values) + sql_suffix).run(**params)
+
+
+def _prepared(conn, sql: str):
+    """SQL için bağlantıda önbelleklenmiş PreparedStatement döner (yoksa hazırlar)."""
+    statement = _PREPARED.get(sql)
+    if statement is None:
+        if len(_PREPARED) >= PREPARED_CACHE_SIZE:
+            # En eski girdiyi sunucu tarafında da kapat
+            oldest = _PREPARED.pop(next(iter(_PREPARED)))
+            oldest.close()
+        statement = conn.prepare(sql)
+        _PREPARED[sql] = statement
+    return statement
+
+
+def main(events: List[func.EventHubEvent], outputEvent: func.Out[bytes]):
+    logging.info('>>> SERVERLESS PROCESSOR (FULL MODE) BAŞLADI <<<')
+    
+    # DB Bağlantısı (worker süreci boyunca önbellekte tutulur)
+    conn = _get_conn()
+
+    # Toplu INSERT için satır listeleri (her tablo için tek round-trip)
+    stock_event_rows = []
+    order_rows = []
+    decision_rows = []
+    esb_rows = []
 
     # Olayları İşle
     for event in events:
         start_time = datetime.datetime.now()
         try:
-            body = event.get_body().decode('utf-8')
-            data = json.loads(body)
+            # msgspec bytes'ı doğrudan tipli struct'a çözer (ara dict yok)
+            data = _decode_event(event.get_body())
             
             # Event verilerini çıkar
-            event_id = data.get('eventId', f"evt-{uuid.uuid4()}")
-            hospital_id = data.get("hospitalId")
-            product_code = data.get("productCode")
-            current_stock = int(data.get('currentStockUnits', 0))
-            daily_consumption = int(data.get('dailyConsumptionUnits', 1))
-            days_of_supply = float(data.get('daysOfSupply', 99))
+            event_id = data.eventId or f"evt-{secrets.token_hex(16)}"
+            hospital_id = data.hospitalId
+            product_code = data.productCode
+            current_stock = int(data.currentStockUnits)
+            daily_consumption = int(data.dailyConsumptionUnits)
+            days_of_supply = data.daysOfSupply
             
-            logging.info(f"📦 Event alındı: {hospital_id}/{product_code} - {days_of_supply:.1f} gün stok")
+            logging.info("📦 Event alındı: %s/%s - %.1f gün stok", hospital_id, product_code, days_of_supply)
             
-            # 1. StockEvents tablosuna kaydet (SOAP ile aynı)
-            if conn:
-                try:
-                    conn.run(
-                        """INSERT INTO StockEvents 
-                           (event_id, hospital_id, product_code, current_stock_units, 
-                            daily_consumption_units, days_of_supply, event_source, received_timestamp)
-                           VALUES (:eid, :hid, :prod, :stock, :daily, :days, 'Serverless', :ts)""",
-                        eid=event_id,
-                        hid=hospital_id,
-                        prod=product_code,
-                        stock=current_stock,
-                        daily=daily_consumption,
-                        days=days_of_supply,
-                        ts=datetime.datetime.utcnow()
-                    )
-                except Exception as db_err:
-                    logging.warning(f"StockEvents insert hatası (tablo yok olabilir): {db_err}")
+            # 1. StockEvents satırı (SOAP ile aynı)
+            stock_event_rows.append({
+                'eid': event_id,
+                'hid': hospital_id,
+                'prod': product_code,
+                'stock': current_stock,
+                'daily': daily_consumption,
+                'days': days_of_supply,
+                'ts': datetime.datetime.utcnow()
+            })
 
             # 2. Decision Engine ile karar ver (SOAP ile AYNI mantık)
             decision = DecisionEngine.evaluate(days_of_supply, daily_consumption, current_stock)
-            logging.info(f"🧠 Karar: {decision['reason']}")
+            logging.info("🧠 Karar: %s", decision['reason'])
             
             if decision['should_order']:
                 # 3. Sipariş ID Oluştur (SOAP formatı ile uyumlu)
-                order_id = f"ORD-{datetime.datetime.utcnow().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+                order_id = f"ORD-{datetime.datetime.utcnow().strftime('%Y%m%d')}-{secrets.token_hex(4).upper()}"
                 
-                logging.info(f"🚨 SİPARİŞ OLUŞTURULUYOR! ID: {order_id}, Miktar: {decision['order_quantity']}, Öncelik: {decision['priority']}")
-
-                # 4. Orders tablosuna kaydet (SOAP ile aynı yapı)
-                if conn:
-                    try:
-                        conn.run(
-                            """INSERT INTO orders (
-                                order_id, hospital_id, product_code, order_quantity, 
-                                priority, order_status, order_source, created_at
-                            ) VALUES (:oid, :hid, :prod, :qty, :prio, 'PENDING', 'Serverless', :time)""",
-                            oid=order_id,
-                            hid=hospital_id,
-                            prod=product_code,
-                            qty=decision['order_quantity'],  # Dinamik hesaplanan miktar
-                            prio=decision['priority'],       # Dinamik hesaplanan öncelik
-                            time=datetime.datetime.utcnow()
-                        )
-                        logging.info("💾 Orders kaydı başarılı.")
-                    except Exception as db_err:
-                        logging.error(f"Orders insert hatası: {db_err}")
-
-                # 5. DecisionLogs tablosuna kaydet (SOAP ile aynı)
-                if conn:
-                    try:
-                        conn.run(
-                            """INSERT INTO DecisionLogs 
-                               (decision_id, event_id, order_id, decision_type, decision_reason, 
-                                days_of_supply_at_decision, threshold_used)
-                               VALUES (:did, :eid, :oid, 'ORDER_CREATED', :reason, :days, :thresh)""",
-                            did=f"dec-{uuid.uuid4()}",
-                            eid=event_id,
-                            oid=order_id,
-                            reason=decision['reason'],
-                            days=days_of_supply,
-                            thresh=DecisionEngine.THRESHOLD_CRITICAL
-                        )
-                    except Exception as db_err:
-                        logging.warning(f"DecisionLogs insert hatası: {db_err}")
+                logging.info("🚨 SİPARİŞ OLUŞTURULUYOR! ID: %s, Miktar: %s, Öncelik: %s", order_id, decision['order_quantity'], decision['priority'])
+
+                # 4. Orders satırı (SOAP ile aynı yapı). CHECK (order_quantity > 0) ihlal
+                # edecek satır (ör. dailyConsumptionUnits == 0) toplu INSERT'e konmaz
+                if decision['order_quantity'] > 0:
+                    order_rows.append({
+                        'oid': order_id,
+                        'hid': hospital_id,
+                        'prod': product_code,
+                        'qty': decision['order_quantity'],  # Dinamik hesaplanan miktar
+                        'prio': decision['priority'],       # Dinamik hesaplanan öncelik
+                        'time': datetime.datetime.utcnow()
+                    })
+
+                    # 5. DecisionLogs satırı (SOAP ile aynı)
+                    decision_rows.append({
+                        'did': secrets.token_hex(16),
+                        'eid': event_id,
+                        'oid': order_id,
+                        'dtype': 'ORDER_CREATED',
+                        'reason': decision['reason'],
+                        'days': days_of_supply,
+                        'thresh': DecisionEngine.THRESHOLD_CRITICAL
+                    })
+                else:
+                    logging.warning("Sipariş miktarı 0, Orders/DecisionLogs kaydı atlandı: %s", order_id)
 
                 # 6. Tahmini teslimat tarihi hesapla
                 estimated_delivery = (datetime.datetime.utcnow() + datetime.timedelta(days=2)).isoformat() + "Z"
 
                 # 7. Event Hub'a OrderCreationCommand gönder (Schema uyumlu)
                 command_message = {
-                    "commandId": f"cmd-{uuid.uuid4()}",
+                    "commandId": f"cmd-{secrets.token_hex(16)}",
                     "commandType": "CreateOrder",  # Schema: const "CreateOrder"
                     "orderId": order_id,
                     "hospitalId": hospital_id,
@@ -168,49 +271,93 @@ def main(events: List[func.EventHubEvent], outputEvent: func.Out[str]):
                     "timestamp": datetime.datetime.utcnow().isoformat() + "Z"
                 }
                 
-                outputEvent.set(json.dumps(command_message))
-                logging.info(f"📤 Event Hub'a (order-commands) iletildi: {order_id}")
+                outputEvent.set(orjson.dumps(command_message))
+                logging.info("📤 Event Hub'a (order-commands) iletildi: %s", order_id)
 
             else:
                 # Sipariş gerekmiyorsa da logla (SOAP ile aynı)
-                logging.info(f"✅ Stok yeterli, sipariş oluşturulmadı: {decision['reason']}")
+                logging.info("✅ Stok yeterli, sipariş oluşturulmadı: %s", decision['reason'])
                 
-                if conn:
-                    try:
-                        conn.run(
-                            """INSERT INTO DecisionLogs 
-                               (decision_id, event_id, decision_type, decision_reason, 
-                                days_of_supply_at_decision, threshold_used)
-                               VALUES (:did, :eid, 'ORDER_SKIPPED', :reason, :days, :thresh)""",
-                            did=f"dec-{uuid.uuid4()}",
-                            eid=event_id,
-                            reason=decision['reason'],
-                            days=days_of_supply,
-                            thresh=DecisionEngine.THRESHOLD_CRITICAL
-                        )
-                    except Exception as db_err:
-                        logging.warning(f"DecisionLogs (skip) insert hatası: {db_err}")
-
-            # 8. ESBLogs tablosuna kaydet (SOAP ile aynı - latency takibi)
-            if conn:
-                try:
-                    latency_ms = int((datetime.datetime.now() - start_time).total_seconds() * 1000)
-                    conn.run(
-                        """INSERT INTO ESBLogs 
-                           (log_id, message_id, source_hospital_id, target_service, latency_ms, status)
-                           VALUES (:lid, :mid, :hid, 'StockEventProcessor', :lat, 'SUCCESS')""",
-                        lid=f"log-{uuid.uuid4()}",
-                        mid=event_id,
-                        hid=hospital_id,
-                        lat=latency_ms
-                    )
-                except Exception as db_err:
-                    logging.warning(f"ESBLogs insert hatası: {db_err}")
+                decision_rows.append({
+                    'did': secrets.token_hex(16),
+                    'eid': event_id,
+                    'oid': None,
+                    'dtype': 'ORDER_SKIPPED',
+                    'reason': decision['reason'],
+                    'days': days_of_supply,
+                    'thresh': DecisionEngine.THRESHOLD_CRITICAL
+                })
+
+            # 8. ESBLogs satırı (latency aşağıda, DB yazımı sonrası hesaplanır)
+            esb_rows.append({
+                'lid': secrets.token_hex(16),
+                'mid': event_id,
+                'hid': hospital_id,
+                'start': start_time
+            })
 
         except Exception as e:
-            logging.error(f"Event işleme hatası: {str(e)}")
+            logging.error("Event işleme hatası: %s", e)
 
+    # Toplu yazım: FK sırası korunur (StockEvents -> Orders -> DecisionLogs -> ESBLogs)
     if conn:
-        conn.close()
+        try:
+            _bulk_insert(
+                conn,
+                """INSERT INTO StockEvents 
+                   (event_id, hospital_id, product_code, current_stock_units, 
+                    daily_consumption_units, days_of_supply, event_source, received_timestamp)
+                   VALUES """,
+                "(:eid{i}, :hid{i}, :prod{i}, :stock{i}, :daily{i}, :days{i}, 'Serverless', :ts{i})",
+                stock_event_rows,
+                # Event Hub en az bir kez teslim eder; tekrar gelen eventId satırı atlanır
+                " ON CONFLICT (event_id) DO NOTHING"
+            )
+        except Exception as db_err:
+            logging.warning("StockEvents insert hatası (tablo yok olabilir): %s", db_err)
+
+        try:
+            _bulk_insert(
+                conn,
+                """INSERT INTO orders (
+                    order_id, hospital_id, product_code, order_quantity, 
+                    priority, order_status, order_source, created_at
+                ) VALUES """,
+                "(:oid{i}, :hid{i}, :prod{i}, :qty{i}, :prio{i}, 'PENDING', 'Serverless', :time{i})",
+                order_rows
+            )
+            if order_rows:
+                logging.info("💾 Orders kaydı başarılı (%d sipariş).", len(order_rows))
+        except Exception as db_err:
+            logging.error("Orders insert hatası: %s", db_err)
+
+        try:
+            _bulk_insert(
+                conn,
+                """INSERT INTO DecisionLogs 
+                   (decision_id, event_id, order_id, decision_type, decision_reason, 
+                    days_of_supply_at_decision, threshold_used)
+                   VALUES """,
+                "(:did{i}, :eid{i}, :oid{i}, CAST(:dtype{i} AS decision_type), :reason{i}, :days{i}, :thresh{i})",
+                decision_rows
+            )
+        except Exception as db_err:
+            logging.warning("DecisionLogs insert hatası: %s", db_err)
+
+        try:
+            # ESBLogs: latency, event'in alınmasından DB yazımının bitişine kadar
+            write_done = datetime.datetime.now()
+            for row in esb_rows:
+                row['lat'] = int((write_done - row.pop('start')).total_seconds() * 1000)
+            _bulk_insert(
+                conn,
+                """INSERT INTO ESBLogs 
+                   (log_id, message_id, source_hospital_id, target_service, latency_ms, status)
+                   VALUES """,
+                "(:lid{i}, :mid{i}, :hid{i}, 'StockEventProcessor', :lat{i}, 'SUCCESS')",
+                esb_rows
+            )
+        except Exception as db_err:
+            logging.warning("ESBLogs insert hatası: %s", db_err)
     
     logging.info('>>> SERVERLESS PROCESSOR TAMAMLANDI <<<')
\ No newline at end of file
@@ -13,15 +13,34 @@ In Azure Functions:
 """
 
 import json
-import uuid
+import logging
+import os
+import secrets
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Human-readable console output is off on the Azure hot path; set STOCK_VERBOSE=1 to enable
+_VERBOSE = os.environ.get("STOCK_VERBOSE") == "1"
 
 
 # ============================================
 # Decision Engine (Same as SOAP Service)
 # ============================================
 
+class Decision(NamedTuple):
+    """Decision engine result for a single InventoryLowEvent."""
+    should_order: bool
+    priority: Optional[str]
+    order_quantity: int
+    reason: str
+    days_of_supply: float
+    threshold_used: float
+
+
 class ServerlessDecisionEngine:
     """
     Decision Engine for Serverless Architecture.
@@ -34,7 +53,7 @@ class ServerlessDecisionEngine:
     RESTOCK_DAYS = 7          # Target days of supply after restock
 
     @staticmethod
-    def evaluate(event: dict) -> dict:
+    def evaluate(event: dict) -> Decision:
         """
         Evaluate an InventoryLowEvent and decide on order creation.
 
@@ -42,47 +61,129 @@ class ServerlessDecisionEngine:
             event: InventoryLowEvent payload
 
         Returns:
-            dict with keys: should_order, priority, order_quantity, reason
+            Decision with should_order, priority, order_quantity, reason
         """
         days_of_supply = float(event.get('daysOfSupply', 999))
         threshold = float(event.get('threshold', ServerlessDecisionEngine.THRESHOLD_CRITICAL))
         daily_consumption = int(event.get('dailyConsumptionUnits', 0))
         current_stock = int(event.get('currentStockUnits', 0))
 
-        result = {
-            'should_order': False,
-            'priority': None,
-            'order_quantity': 0,
-            'reason': '',
-            'days_of_supply': days_of_supply,
-            'threshold_used': threshold
-        }
-
         # Decision: Should we trigger an order?
-        if days_of_supply < threshold:
-            result['should_order'] = True
-
+        should_order = days_of_supply < threshold
+        order_quantity = 0
+        if should_order:
             # Calculate order quantity: (daily * 7) - current
             target_stock = daily_consumption * ServerlessDecisionEngine.RESTOCK_DAYS
-            result['order_quantity'] = max(target_stock - current_stock, daily_consumption)
+            order_quantity = max(target_stock - current_stock, daily_consumption)
+
+        return ServerlessDecisionEngine.build_decision(
+            days_of_supply, threshold, should_order, order_quantity
+        )
+
+    @staticmethod
+    def evaluate_batch(events: List[Dict[str, Any]]):
+        """
+        Vectorized evaluate() over a whole EventHub batch.
 
+        Args:
+            events: List of InventoryLowEvent payloads
+
+        Returns:
+            tuple of NumPy arrays: (days_of_supply, threshold, should_order, order_quantity)
+        """
+        n = len(events)
+        days_of_supply = np.fromiter(
+            (float(e.get('daysOfSupply', 999)) for e in events), dtype=np.float64, count=n
+        )
+        threshold = np.fromiter(
+            (float(e.get('threshold', ServerlessDecisionEngine.THRESHOLD_CRITICAL)) for e in events),
+            dtype=np.float64, count=n
+        )
+
+        # Partition first: only triggering events need their quantity fields read
+        should_order = days_of_supply < threshold
+        triggered = np.flatnonzero(should_order)
+        m = len(triggered)
+
+        daily_consumption = np.fromiter(
+            (int(events[i].get('dailyConsumptionUnits', 0)) for i in triggered), dtype=np.int64, count=m
+        )
+        current_stock = np.fromiter(
+            (int(events[i].get('currentStockUnits', 0)) for i in triggered), dtype=np.int64, count=m
+        )
+
+        target_stock = daily_consumption * ServerlessDecisionEngine.RESTOCK_DAYS
+        order_quantity = np.zeros(n, dtype=np.int64)
+        order_quantity[triggered] = np.maximum(target_stock - current_stock, daily_consumption)
+
+        return days_of_supply, threshold, should_order, order_quantity
+
+    @staticmethod
+    def build_decision(days_of_supply: float, threshold: float,
+                       should_order: bool, order_quantity: int) -> Decision:
+        """Build the Decision (priority and reason) for an evaluated event."""
+        # Reasons only depend on the one-decimal rendering of days_of_supply:
+        # use the prebuilt string for its 0.1-day bucket when there is one
+        bucket = _days_bucket(days_of_supply)
+        priority = None
+        if should_order:
             # Determine priority based on urgency
             if days_of_supply < ServerlessDecisionEngine.THRESHOLD_URGENT:
-                result['priority'] = 'URGENT'
-                result['reason'] = (
-                    f'CRITICAL: Only {days_of_supply:.1f} days of supply remaining '
-                    f'(< {ServerlessDecisionEngine.THRESHOLD_URGENT} day)'
-                )
+                priority = 'URGENT'
+                if bucket >= 0:
+                    reason = _CRITICAL_REASONS[bucket]
+                else:
+                    reason = _REASON_CRITICAL.format(days_of_supply, ServerlessDecisionEngine.THRESHOLD_URGENT)
             else:
-                result['priority'] = 'HIGH'
-                result['reason'] = (
-                    f'LOW STOCK: {days_of_supply:.1f} days of supply remaining '
-                    f'(< {threshold} days)'
-                )
+                priority = 'HIGH'
+                if bucket >= 0 and threshold == ServerlessDecisionEngine.THRESHOLD_CRITICAL:
+                    reason = _LOW_REASONS[bucket]
+                else:
+                    reason = _REASON_LOW.format(days_of_supply, threshold)
         else:
-            result['reason'] = f'Stock levels adequate: {days_of_supply:.1f} days of supply'
+            if bucket >= 0:
+                reason = _ADEQUATE_REASONS[bucket]
+            else:
+                reason = _REASON_ADEQUATE.format(days_of_supply)
+
+        return Decision(should_order, priority, order_quantity, reason, days_of_supply, threshold)
+
 
-        return result
+_REASON_CRITICAL = 'CRITICAL: Only {:.1f} days of supply remaining (< {} day)'
+_REASON_LOW = 'LOW STOCK: {:.1f} days of supply remaining (< {} days)'
+_REASON_ADEQUATE = 'Stock levels adequate: {:.1f} days of supply'
+
+# Buckets are tenths of a day; values past the table fall back to formatting
+_REASON_TABLE_DAYS = 30
+_REASON_TABLE_LIMIT = _REASON_TABLE_DAYS * 10
+
+
+def _days_bucket(days_of_supply: float) -> int:
+    """
+    Return k such that f'{days_of_supply:.1f}' == f'{k / 10:.1f}', or -1 when the
+    value is outside the table or too close to a rounding tie to decide without
+    formatting (NaN, inf, 0.0 and -0.0 also return -1).
+    """
+    scaled = days_of_supply * 10
+    if not 0 < scaled < _REASON_TABLE_LIMIT:
+        return -1
+    k = int(scaled)
+    frac = scaled - k - 0.5
+    if -1e-6 < frac < 1e-6:
+        return -1
+    return k + (frac > 0)
+
+
+# A days value below a threshold never renders above it; LOW is prebuilt for the default threshold only
+_CRITICAL_REASONS = tuple(
+    _REASON_CRITICAL.format(k / 10, ServerlessDecisionEngine.THRESHOLD_URGENT)
+    for k in range(int(ServerlessDecisionEngine.THRESHOLD_URGENT * 10) + 1)
+)
+_LOW_REASONS = tuple(
+    _REASON_LOW.format(k / 10, ServerlessDecisionEngine.THRESHOLD_CRITICAL)
+    for k in range(int(ServerlessDecisionEngine.THRESHOLD_CRITICAL * 10) + 1)
+)
+_ADEQUATE_REASONS = tuple(_REASON_ADEQUATE.format(k / 10) for k in range(_REASON_TABLE_LIMIT + 1))
 
 
 # ============================================
@@ -96,13 +197,44 @@ class OrderCommandGenerator:
     """
 
     DEFAULT_WAREHOUSE = "CENTRAL-WAREHOUSE"
+    DELIVERY_DAYS = {
+        'URGENT': 1,  # Next day delivery for urgent
+        'HIGH': 2     # 2-day delivery for high priority
+    }
+    DELIVERY_DAYS_DEFAULT = 5  # Standard delivery
+    DELIVERY_DAYS_OPTIONS = (*DELIVERY_DAYS.values(), DELIVERY_DAYS_DEFAULT)
+
+    @staticmethod
+    def batch_timestamps(now: Optional[datetime] = None) -> dict:
+        """
+        Precompute the timestamp strings shared by every command in a batch.
+
+        Args:
+            now: Reference time (defaults to current UTC time)
+
+        Returns:
+            dict of create_command keyword args: now_iso, date_str, delivery_iso_by_days
+        """
+        now = now or datetime.now(timezone.utc)
+        return {
+            'now_iso': now.isoformat(),
+            'date_str': now.strftime('%Y%m%d'),
+            'delivery_iso_by_days': {
+                days: (now + timedelta(days=days)).isoformat()
+                for days in OrderCommandGenerator.DELIVERY_DAYS_OPTIONS
+            }
+        }
 
     @staticmethod
     def create_command(
         event: dict,
-        decision: dict,
+        decision: Decision,
         command_id: Optional[str] = None,
-        order_id: Optional[str] = None
+        order_id: Optional[str] = None,
+        *,
+        now_iso: Optional[str] = None,
+        date_str: Optional[str] = None,
+        delivery_iso_by_days: Optional[Dict[int, str]] = None
     ) -> dict:
         """
         Create an OrderCreationCommand from an event and decision.
@@ -112,33 +244,34 @@ class OrderCommandGenerator:
             decision: Decision engine result
             command_id: Optional custom command ID
             order_id: Optional custom order ID
+            now_iso, date_str, delivery_iso_by_days: Optional precomputed
+                timestamps from batch_timestamps() (computed per call if omitted)
 
         Returns:
             dict: Command payload matching OrderCreationCommand.schema.json
         """
-        now = datetime.now(timezone.utc)
+        if now_iso is None or date_str is None or delivery_iso_by_days is None:
+            stamps = OrderCommandGenerator.batch_timestamps()
+            now_iso = stamps['now_iso']
+            date_str = stamps['date_str']
+            delivery_iso_by_days = stamps['delivery_iso_by_days']
 
         # Calculate estimated delivery based on priority
-        if decision['priority'] == 'URGENT':
-            delivery_days = 1  # Next day delivery for urgent
-        elif decision['priority'] == 'HIGH':
-            delivery_days = 2  # 2-day delivery for high priority
-        else:
-            delivery_days = 5  # Standard delivery
-
-        estimated_delivery = now + timedelta(days=delivery_days)
+        delivery_days = OrderCommandGenerator.DELIVERY_DAYS.get(
+            decision.priority, OrderCommandGenerator.DELIVERY_DAYS_DEFAULT
+        )
 
         command = {
-            "commandId": command_id or f"cmd-{uuid.uuid4()}",
+            "commandId": command_id or f"cmd-{secrets.token_hex(16)}",
             "commandType": "CreateOrder",
-            "orderId": order_id or f"ORD-{now.strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}",
+            "orderId": order_id or f"ORD-{date_str}-{secrets.token_hex(4).upper()}",
             "hospitalId": event.get('hospitalId'),
             "productCode": event.get('productCode'),
-            "orderQuantity": decision['order_quantity'],
-            "priority": decision['priority'],
-            "estimatedDeliveryDate": estimated_delivery.isoformat(),
+            "orderQuantity": decision.order_quantity,
+            "priority": decision.priority,
+            "estimatedDeliveryDate": delivery_iso_by_days[delivery_days],
             "warehouseId": OrderCommandGenerator.DEFAULT_WAREHOUSE,
-            "timestamp": now.isoformat()
+            "timestamp": now_iso
         }
 
         return command
@@ -148,7 +281,7 @@ class OrderCommandGenerator:
 # Event Processor (Azure Function Logic)
 # ============================================
 
-def process_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def process_events(events: List[Dict[str, Any]], verbose: bool = _VERBOSE) -> List[Dict[str, Any]]:
     """
     Process a batch of InventoryLowEvents.
 
@@ -157,61 +290,87 @@ def process_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
     Args:
         events: List of InventoryLowEvent payloads
+        verbose: Print a human-readable trace of each event (default: STOCK_VERBOSE env)
 
     Returns:
         List of OrderCreationCommand payloads for triggered orders
     """
-    print("\n" + "=" * 70)
-    print("  SERVERLESS EVENT PROCESSOR")
-    print("  Processing InventoryLowEvents...")
-    print("=" * 70)
+    if verbose:
+        print("\n" + "=" * 70)
+        print("  SERVERLESS EVENT PROCESSOR")
+        print("  Processing InventoryLowEvents...")
+        print("=" * 70)
 
     decision_engine = ServerlessDecisionEngine()
     command_generator = OrderCommandGenerator()
     order_commands = []
 
-    for i, event in enumerate(events, 1):
-        print(f"\n--- Event {i}/{len(events)} ---")
-        print(f"Event ID: {event.get('eventId')}")
-        print(f"Hospital: {event.get('hospitalId')}")
-        print(f"Product: {event.get('productCode')}")
-        print(f"Current Stock: {event.get('currentStockUnits')} units")
-        print(f"Daily Consumption: {event.get('dailyConsumptionUnits')} units")
-        print(f"Days of Supply: {event.get('daysOfSupply')}")
-        print(f"Threshold: {event.get('threshold')} days")
-
-        # Run decision engine
-        decision = decision_engine.evaluate(event)
-
-        if decision['should_order']:
-            print(f"\n  >>> TRIGGER ORDER COMMAND <<<")
-            print(f"  Reason: {decision['reason']}")
-            print(f"  Priority: {decision['priority']}")
-            print(f"  Order Quantity: {decision['order_quantity']} units")
-
+    # Evaluate the whole batch as array ops; only triggered events need dicts
+    days, thresholds, should_order, quantities = decision_engine.evaluate_batch(events)
+    indices = range(len(events)) if verbose else np.flatnonzero(should_order)
+
+    # One os.urandom call supplies 16 random bytes per command ID for the whole batch
+    id_bytes = os.urandom(16 * int(np.count_nonzero(should_order)))
+
+    # Events in a batch share the same timestamp (sub-second), so compute it once
+    stamps = command_generator.batch_timestamps()
+
+    for i in indices:
+        event = events[i]
+        logger.debug(
+            "evt %s hid=%s prod=%s dos=%s",
+            event.get('eventId'), event.get('hospitalId'),
+            event.get('productCode'), event.get('daysOfSupply')
+        )
+        if verbose:
+            print(f"\n--- Event {i + 1}/{len(events)} ---")
+            print(f"Event ID: {event.get('eventId')}")
+            print(f"Hospital: {event.get('hospitalId')}")
+            print(f"Product: {event.get('productCode')}")
+            print(f"Current Stock: {event.get('currentStockUnits')} units")
+            print(f"Daily Consumption: {event.get('dailyConsumptionUnits')} units")
+            print(f"Days of Supply: {event.get('daysOfSupply')}")
+            print(f"Threshold: {event.get('threshold')} days")
+
+        decision = decision_engine.build_decision(
+            float(days[i]), float(thresholds[i]), bool(should_order[i]), int(quantities[i])
+        )
+
+        if decision.should_order:
             # Generate order command
-            command = command_generator.create_command(event, decision)
+            offset = 16 * len(order_commands)
+            command = command_generator.create_command(
+                event, decision,
+                command_id=f"cmd-{id_bytes[offset:offset + 16].hex()}",
+                **stamps
+            )
             order_commands.append(command)
 
-            print(f"\n  Generated OrderCreationCommand:")
-            print(f"  {json.dumps(command, indent=4)}")
-        else:
-            print(f"\n  [OK] No order needed: {decision['reason']}")
+            if verbose:
+                print(f"\n  >>> TRIGGER ORDER COMMAND <<<")
+                print(f"  Reason: {decision.reason}")
+                print(f"  Priority: {decision.priority}")
+                print(f"  Order Quantity: {decision.order_quantity} units")
+                print(f"\n  Generated OrderCreationCommand:")
+                print(f"  {json.dumps(command, indent=4)}")
+        elif verbose:
+            print(f"\n  [OK] No order needed: {decision.reason}")
 
     # Summary
-    print("\n" + "=" * 70)
-    print("  PROCESSING COMPLETE")
-    print("=" * 70)
-    print(f"  Total events processed: {len(events)}")
-    print(f"  Orders triggered: {len(order_commands)}")
+    if verbose:
+        print("\n" + "=" * 70)
+        print("  PROCESSING COMPLETE")
+        print("=" * 70)
+        print(f"  Total events processed: {len(events)}")
+        print(f"  Orders triggered: {len(order_commands)}")
 
-    if order_commands:
-        print("\n  Orders to be sent to Order Creation Hub:")
-        for cmd in order_commands:
-            print(f"    - {cmd['orderId']}: {cmd['productCode']} "
-                  f"({cmd['orderQuantity']} units, {cmd['priority']})")
+        if order_commands:
+            print("\n  Orders to be sent to Order Creation Hub:")
+            for cmd in order_commands:
+                print(f"    - {cmd['orderId']}: {cmd['productCode']} "
+                      f"({cmd['orderQuantity']} units, {cmd['priority']})")
 
-    print("=" * 70)
+        print("=" * 70)
 
     return order_commands
 
@@ -308,7 +467,7 @@ def run_standalone_test():
     ]
 
     # Process events
-    order_commands = process_events(test_events)
+    order_commands = process_events(test_events, verbose=True)
 
     # Output final result
     print("\n" + "=" * 70)
@@ -2,23 +2,29 @@
 Real SOAP Service for Hospital Supply Chain - Central Warehouse (Team 1)
 Implements StockUpdateService AND OrderCreationService with Database Persistence
 
-Run with: python3 real_soap_service.py
+Run with: gunicorn -k gthread -w 4 --threads 16 --keep-alive 30 -b 0.0.0.0:8000 wsgi:application
 """
 
+import atexit
 import logging
+import queue
 import random
+import threading
 import time
-import uuid
 import os
 import psycopg2
 from datetime import datetime
+from functools import lru_cache
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
-from flask import Flask, request as flask_request, Response
+from flask import Flask
 from spyne import Application, Service, rpc
 from spyne.model.complex import ComplexModel
 from spyne.model.primitive import Unicode, Integer, Decimal, Boolean
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -36,21 +42,140 @@ DB_NAME = os.environ.get("POSTGRES_DB", "hospital_db")
 DB_USER = os.environ.get("POSTGRES_USER", "app_user")
 DB_PASS = os.environ.get("POSTGRES_PASSWORD", "secure_password")
 DB_PORT = os.environ.get("DB_PORT", "5432")
-
-def get_db_connection():
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "5"))
+# Havuz worker (process) başınadır: 16 istek thread'i + log yazıcısı için yeterli
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "20"))
+
+# WSDL'de ilan edilen servis adresi (örn. https://host/CentralServices). Verilirse WSDL
+# worker açılışında bir kez üretilir; verilmezse Spyne onu ilk ?wsdl isteğinde üretip önbelleğe alır
+SOAP_PUBLIC_URL = os.environ.get("SOAP_PUBLIC_URL")
+
+# ESB gecikme simülasyonu yalnızca demo/test için (ESB_SIMULATE=1)
+ESB_SIMULATE = os.environ.get("ESB_SIMULATE", "0") == "1"
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Sunucu tarafı PREPARE'lerin bu oturumda yapılıp yapılmadığını taşır."""
+    prepared = False
+
+# Bağlantı havuzu ilk istekte oluşturulur (DB kapalıyken import patlamasın)
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def _get_db_pool():
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    host=DB_HOST,
+                    database=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASS,
+                    port=DB_PORT,
+                    connection_factory=PreparedConnection
+                )
+    return _db_pool
+
+def get_db_connection(autocommit=False):
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS,
-            port=DB_PORT
-        )
+        conn = _get_db_pool().getconn()
+        try:
+            conn.autocommit = autocommit
+            if not conn.prepared:
+                _prepare_statements(conn)
+        except Exception:
+            # PREPARE başarısızsa bağlantı havuza kapatılarak iade edilir (havuz tükenmesin)
+            _get_db_pool().putconn(conn, close=True)
+            raise
         return conn
     except Exception as e:
-        logger.error(f"Failed to connect to database: {e}")
+        logger.error("Failed to connect to database: %s", e)
         raise
 
+def release_db_connection(conn):
+    # Kopmuş bağlantılar havuza geri konmaz, kapatılır
+    _get_db_pool().putconn(conn, close=bool(conn.closed))
+
+# ============================================
+# Background Log Writer (ESBLogs / DecisionLogs)
+# ============================================
+
+# Log satırları istek yolunda yazılmaz; kuyruğa atılır ve arka plan thread'i
+# 50 ms'de bir (ya da 100 satır birikince) tek execute_values ile boşaltır.
+LOG_FLUSH_INTERVAL = 0.05
+LOG_FLUSH_BATCH = 100
+
+ESB_LOG_SQL = "INSERT INTO ESBLogs (log_id, message_id, source_hospital_id, target_service, latency_ms, status) VALUES %s"
+DECISION_LOG_SQL = "INSERT INTO DecisionLogs (decision_id, event_id, order_id, decision_type, decision_reason, days_of_supply_at_decision, threshold_used) VALUES %s"
+
+_log_queue = queue.Queue()
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def _flush_logs(batch):
+    decision_rows = [row for kind, row in batch if kind == 'decision']
+    esb_rows = [row for kind, row in batch if kind == 'esb']
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        # DecisionLogs -> StockEvents/Orders FK'leri zaten commit edilmiş durumda
+        if decision_rows:
+            execute_values(cur, DECISION_LOG_SQL, decision_rows, page_size=LOG_FLUSH_BATCH)
+        if esb_rows:
+            execute_values(cur, ESB_LOG_SQL, esb_rows, page_size=LOG_FLUSH_BATCH)
+        conn.commit()
+    except Exception as e:
+        if conn and not conn.closed:
+            conn.rollback()
+        logger.error("[LogWriter] Failed to write %d log rows: %s", len(batch), e)
+    finally:
+        if conn: release_db_connection(conn)
+
+def _log_writer_loop():
+    while True:
+        batch = [_log_queue.get()]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while len(batch) < LOG_FLUSH_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _flush_logs(batch)
+
+def _enqueue_log(kind, row):
+    # Thread ilk log ile başlatılır (fork eden sunucularda her worker kendi thread'ini açar)
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                _log_writer = threading.Thread(target=_log_writer_loop, name='LogWriter', daemon=True)
+                _log_writer.start()
+    _log_queue.put((kind, row))
+
+def enqueue_esb_log(log_id, message_id, hospital_id, target_service, latency_ms, status='SUCCESS'):
+    _enqueue_log('esb', (log_id, message_id, hospital_id, target_service, latency_ms, status))
+
+def enqueue_decision_log(decision_id, event_id, order_id, decision_type, reason, days_of_supply, threshold):
+    _enqueue_log('decision', (decision_id, event_id, order_id, decision_type, reason, days_of_supply, threshold))
+
+@atexit.register
+def _drain_logs():
+    # Kapanışta kuyrukta kalan satırları yaz
+    batch = []
+    while True:
+        try:
+            batch.append(_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        _flush_logs(batch)
+
 # ============================================
 # Models: StockUpdate
 # ============================================
@@ -95,6 +220,59 @@ class OrderCreationResult(ComplexModel):
 # Helpers
 # ============================================
 
+class FastUUID:
+    """Thread başına tutulan os.urandom tamponundan kimlik üretir (her ID için syscall yok)."""
+    BUFFER_SIZE = 4096
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def _take(self, n):
+        if len(self._buf) < n:
+            self._buf = bytearray(os.urandom(self.BUFFER_SIZE))
+        b = bytes(self._buf[-n:])
+        del self._buf[-n:]
+        return b
+
+    def next_hex(self, n=16):
+        return self._take(n).hex()
+
+    def next_uuid(self):
+        # UUIDv7 yerleşimi: 48 bit ms zaman damgası + version/variant + rastgele bitler
+        rnd = self._take(10)
+        h = ((time.time_ns() // 1_000_000).to_bytes(6, 'big')
+             + bytes((0x70 | (rnd[0] & 0x0F), rnd[1], 0x80 | (rnd[2] & 0x3F)))
+             + rnd[3:]).hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+_tls = threading.local()
+
+def _id_gen():
+    gen = getattr(_tls, 'gen', None)
+    if gen is None:
+        gen = _tls.gen = FastUUID()
+    return gen
+
+def _rand():
+    # Modül düzeyindeki random.* paylaşılan tek örneği kullanır; thread başına ayrı Random
+    rand = getattr(_tls, 'rand', None)
+    if rand is None:
+        rand = _tls.rand = random.Random()
+    return rand
+
+# Fork edilen worker ebeveynin tamponunu (aynı rastgele baytları) devralmasın
+os.register_at_fork(after_in_child=_tls.__dict__.clear)
+
+# Sipariş numarasındaki YYYYMMDD yalnızca UTC gün değişiminde yeniden hesaplanır
+_order_date_cache = (-1, '')
+
+def _order_date():
+    global _order_date_cache
+    day = int(time.time()) // 86400
+    if _order_date_cache[0] != day:
+        _order_date_cache = (day, datetime.utcfromtimestamp(day * 86400).strftime('%Y%m%d'))
+    return _order_date_cache[1]
+
 class DecisionEngine:
     THRESHOLD_CRITICAL = 2.0
     THRESHOLD_URGENT = 1.0
@@ -102,50 +280,79 @@ class DecisionEngine:
 
     @staticmethod
     def evaluate(days_of_supply: float, daily_consumption: int, current_stock: int) -> dict:
-        result = {'should_order': False, 'priority': None, 'order_quantity': 0, 'reason': ''}
-        
-        if days_of_supply < DecisionEngine.THRESHOLD_CRITICAL:
-            result['should_order'] = True
-            target_stock = daily_consumption * DecisionEngine.RESTOCK_DAYS
-            calc_quantity = target_stock - current_stock
-            result['order_quantity'] = max(int(calc_quantity), daily_consumption)
-
-            if days_of_supply < DecisionEngine.THRESHOLD_URGENT:
-                result['priority'] = 'URGENT'
-                result['reason'] = f'CRITICAL: {days_of_supply:.1f} days (< {DecisionEngine.THRESHOLD_URGENT})'
-            else:
-                result['priority'] = 'HIGH'
-                result['reason'] = f'LOW STOCK: {days_of_supply:.1f} days (< {DecisionEngine.THRESHOLD_CRITICAL})'
-        else:
-            result['reason'] = f'Adequate stock: {days_of_supply:.1f} days'
+        # Her çağrı kendi dict'ini alır; önbellekteki tuple paylaşılır
+        return dict(zip(_DECISION_KEYS, _evaluate_cached(days_of_supply, daily_consumption, current_stock)))
+
+_DECISION_KEYS = ('should_order', 'priority', 'order_quantity', 'reason')
+_REASON_CRITICAL = 'CRITICAL: {:.1f} days (< ' + str(DecisionEngine.THRESHOLD_URGENT) + ')'
+_REASON_LOW = 'LOW STOCK: {:.1f} days (< ' + str(DecisionEngine.THRESHOLD_CRITICAL) + ')'
+_REASON_ADEQUATE = 'Adequate stock: {:.1f} days'
+
+# Anahtar gün değerinin kendisidir: yuvarlamak eşik kararını değiştirebilirdi (1.999 -> 2.0)
+@lru_cache(maxsize=4096)
+def _evaluate_cached(days_of_supply: float, daily_consumption: int, current_stock: int) -> tuple:
+    if days_of_supply < DecisionEngine.THRESHOLD_CRITICAL:
+        target_stock = daily_consumption * DecisionEngine.RESTOCK_DAYS
+        order_quantity = max(int(target_stock - current_stock), daily_consumption)
+
+        if days_of_supply < DecisionEngine.THRESHOLD_URGENT:
+            return (True, 'URGENT', order_quantity, _REASON_CRITICAL.format(days_of_supply))
+        return (True, 'HIGH', order_quantity, _REASON_LOW.format(days_of_supply))
 
-        return result
+    return (False, None, 0, _REASON_ADEQUATE.format(days_of_supply))
 
 # ============================================
 # Service 1: StockUpdateService
 # ============================================
 
+# StockEvents ve Orders (yalnızca should_order ise) kayıtlarını tek bir statement
+# ile yazar. Enum kolonları açıkça cast edilir. Karar ve ESB logları kuyruğa gider.
+STOCK_UPDATE_SQL = """
+    PREPARE stock_update (varchar, varchar, varchar, integer, integer, numeric, boolean, varchar, integer, priority_type) AS
+    WITH e AS (
+        INSERT INTO StockEvents (event_id, hospital_id, product_code, current_stock_units, daily_consumption_units, days_of_supply, event_source, received_timestamp)
+        VALUES ($1, $2, $3, $4, $5, $6, 'SOA', NOW())
+        RETURNING event_id
+    )
+    INSERT INTO Orders (order_id, hospital_id, product_code, order_quantity, priority, order_source, order_status)
+    SELECT $8, $2, $3, $9, $10, 'SOA', 'PENDING'
+    FROM e WHERE $7
+"""
+
+ORDER_CREATE_SQL = """
+    PREPARE order_create (varchar, varchar, varchar, integer, priority_type) AS
+    INSERT INTO Orders
+    (order_id, hospital_id, product_code, order_quantity, priority, order_source, order_status, notes)
+    VALUES ($1, $2, $3, $4, $5, 'SOA', 'PENDING', 'Created via OrderCreationService')
+"""
+
+def _prepare_statements(conn):
+    # PREPARE oturum ömürlüdür ve rollback ile geri alınmaz; bağlantı başına bir kez
+    with conn.cursor() as cur:
+        cur.execute(STOCK_UPDATE_SQL)
+        cur.execute(ORDER_CREATE_SQL)
+    conn.commit()
+    conn.prepared = True
+
 class StockUpdateServiceImpl(Service):
     @rpc(StockUpdateRequest, _returns=StockUpdateResult)
     def StockUpdate(ctx, request):
         # ... (Önceki kodun aynısı) ...
         start_time = time.time()
-        logger.info(f"[StockUpdate] Received update from {request.hospitalId}")
+        logger.info("[StockUpdate] Received update from %s", request.hospitalId)
         
         # Simüle edilmiş gecikme
-        time.sleep(random.uniform(0.1, 0.5))
+        if ESB_SIMULATE:
+            time.sleep(0.1 + _rand().random() * 0.4)
 
         conn = None
         try:
-            conn = get_db_connection()
+            # CTE tek statement olduğundan kendi başına atomiktir; autocommit ile
+            # BEGIN ve COMMIT ayrı round-trip olarak gitmez
+            conn = get_db_connection(autocommit=True)
             cur = conn.cursor()
-            event_id = f"evt-{uuid.uuid4()}"
-
-            # Event Kaydet
-            cur.execute("""
-                INSERT INTO StockEvents (event_id, hospital_id, product_code, current_stock_units, daily_consumption_units, days_of_supply, event_source, received_timestamp)
-                VALUES (%s, %s, %s, %s, %s, %s, 'SOA', NOW())
-            """, (event_id, request.hospitalId, request.productCode, request.currentStockUnits, request.dailyConsumptionUnits, request.daysOfSupply))
+            ids = _id_gen()
+            event_id = f"evt-{ids.next_uuid()}"
 
             # Karar Ver
             decision = DecisionEngine.evaluate(float(request.daysOfSupply), int(request.dailyConsumptionUnits), int(request.currentStockUnits))
@@ -153,37 +360,44 @@ class StockUpdateServiceImpl(Service):
             response.success = True
             
             if decision['should_order']:
-                order_id = f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-                cur.execute("""
-                    INSERT INTO Orders (order_id, hospital_id, product_code, order_quantity, priority, order_source, order_status)
-                    VALUES (%s, %s, %s, %s, %s, 'SOA', 'PENDING')
-                """, (order_id, request.hospitalId, request.productCode, decision['order_quantity'], decision['priority']))
-                
-                cur.execute("INSERT INTO DecisionLogs (decision_id, event_id, order_id, decision_type, decision_reason, days_of_supply_at_decision, threshold_used) VALUES (%s, %s, %s, 'ORDER_CREATED', %s, %s, %s)",
-                           (f"dec-{uuid.uuid4()}", event_id, order_id, decision['reason'], request.daysOfSupply, DecisionEngine.THRESHOLD_CRITICAL))
-                
+                order_id = f"ORD-{_order_date()}-{ids.next_hex(4).upper()}"
                 response.orderTriggered = True
                 response.orderId = order_id
                 response.message = f"Order created: {order_id}"
             else:
-                cur.execute("INSERT INTO DecisionLogs (decision_id, event_id, decision_type, decision_reason, days_of_supply_at_decision, threshold_used) VALUES (%s, %s, 'ORDER_SKIPPED', %s, %s, %s)",
-                           (f"dec-{uuid.uuid4()}", event_id, decision['reason'], request.daysOfSupply, DecisionEngine.THRESHOLD_CRITICAL))
+                order_id = None
                 response.orderTriggered = False
                 response.message = "Stock adequate"
 
-            # ESB Log
-            cur.execute("INSERT INTO ESBLogs (log_id, message_id, source_hospital_id, target_service, latency_ms, status) VALUES (%s, %s, %s, 'StockUpdateService', %s, 'SUCCESS')",
-                       (f"log-{uuid.uuid4()}", event_id, request.hospitalId, int((time.time() - start_time) * 1000)))
+            # Event + Sipariş: tek round-trip
+            cur.execute("EXECUTE stock_update (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", (
+                event_id,
+                request.hospitalId,
+                request.productCode,
+                request.currentStockUnits,
+                request.dailyConsumptionUnits,
+                request.daysOfSupply,
+                decision['should_order'],
+                order_id,
+                decision['order_quantity'],
+                decision['priority']
+            ))
 
-            conn.commit()
+            # Karar + ESB Log: kayıt commit edildikten sonra arka plan yazıcısına
+            enqueue_decision_log(
+                ids.next_uuid(), event_id, order_id,
+                'ORDER_CREATED' if decision['should_order'] else 'ORDER_SKIPPED',
+                decision['reason'], request.daysOfSupply, DecisionEngine.THRESHOLD_CRITICAL
+            )
+            enqueue_esb_log(ids.next_uuid(), event_id, request.hospitalId, 'StockUpdateService',
+                            int((time.time() - start_time) * 1000))
             return response
 
         except Exception as e:
-            if conn: conn.rollback()
-            logger.error(f"[StockUpdate] Error: {e}")
+            logger.error("[StockUpdate] Error: %s", e)
             return StockUpdateResult(success=False, message="Internal Server Error")
         finally:
-            if conn: conn.close()
+            if conn: release_db_connection(conn)
 
 # ============================================
 # Service 2: OrderCreationService (YENİ)
@@ -193,22 +407,18 @@ class OrderCreationServiceImpl(Service):
     @rpc(OrderCreationRequest, _returns=OrderCreationResult)
     def CreateOrder(ctx, request):
         start_time = time.time()
-        logger.info(f"[OrderCreation] Received order command for {request.hospitalId}")
-        
+
         conn = None
         try:
-            conn = get_db_connection()
+            # Tek statement: autocommit ile BEGIN/COMMIT round-trip'leri yok
+            conn = get_db_connection(autocommit=True)
             cur = conn.cursor()
             
             # ID yoksa oluştur
-            order_id = request.orderId if request.orderId else f"ORD-MANUAL-{uuid.uuid4().hex[:8].upper()}"
+            order_id = request.orderId if request.orderId else f"ORD-MANUAL-{_id_gen().next_hex(4).upper()}"
             
             # Veritabanına kaydet
-            cur.execute("""
-                INSERT INTO Orders 
-                (order_id, hospital_id, product_code, order_quantity, priority, order_source, order_status, notes)
-                VALUES (%s, %s, %s, %s, %s, 'SOA', 'PENDING', 'Created via OrderCreationService')
-            """, (
+            cur.execute("EXECUTE order_create (%s, %s, %s, %s, %s)", (
                 order_id,
                 request.hospitalId,
                 request.productCode,
@@ -218,59 +428,50 @@ class OrderCreationServiceImpl(Service):
             
             # TODO: Gerçek senaryoda burada Hastane'nin servisine (ReceiveOrder) istek atılır.
             # Şimdilik sadece veritabanına kaydediyoruz (Requirements A.2.4)
-            
-            # ESB Log
-            cur.execute("INSERT INTO ESBLogs (log_id, message_id, source_hospital_id, target_service, latency_ms, status) VALUES (%s, %s, %s, 'OrderCreationService', %s, 'SUCCESS')",
-                       (f"log-{uuid.uuid4()}", order_id, request.hospitalId, int((time.time() - start_time) * 1000)))
 
-            conn.commit()
+            # ESB Log
+            enqueue_esb_log(_id_gen().next_uuid(), order_id, request.hospitalId, 'OrderCreationService',
+                            int((time.time() - start_time) * 1000))
             
-            logger.info(f"[OrderCreation] Order {order_id} created successfully")
+            logger.info("[OrderCreation] Order %s created for %s", order_id, request.hospitalId)
             return OrderCreationResult(success=True, message="Order processed", orderId=order_id)
 
         except Exception as e:
-            if conn: conn.rollback()
-            logger.error(f"[OrderCreation] Error: {e}")
+            logger.error("[OrderCreation] Error: %s", e)
             return OrderCreationResult(success=False, message=f"Error: {str(e)}", orderId="")
         finally:
-            if conn: conn.close()
+            if conn: release_db_connection(conn)
 
 # ============================================
 # Application Setup
 # ============================================
 
-# İki servisi tek bir Spyne uygulamasında birleştiriyoruz
+# Hastane mesajları birkaç KB; bu sınırı aşan istek gövdesi okunmadan reddedilir
+SOAP_MAX_REQUEST_BYTES = 64 * 1024
+
+# İki servisi tek bir Spyne uygulamasında birleştiriyoruz.
+# XSD doğrulaması yerine 'soft' doğrulama: min_occurs/tip kuralları Python tarafında kontrol edilir
 soap_app = Application(
     [StockUpdateServiceImpl, OrderCreationServiceImpl],
     tns='http://hospital-supply-chain.example.com/soap',
-    in_protocol=Soap11(validator='lxml'),
+    in_protocol=Soap11(validator='soft'),
     out_protocol=Soap11(),
     name='CentralServices'
 )
 
-wsgi_app = WsgiApplication(soap_app)
+wsgi_app = WsgiApplication(
+    soap_app,
+    max_content_length=SOAP_MAX_REQUEST_BYTES,
+    block_length=SOAP_MAX_REQUEST_BYTES
+)
+
+if SOAP_PUBLIC_URL:
+    wsgi_app.doc.wsdl11.build_interface_document(SOAP_PUBLIC_URL)
 flask_app = Flask(__name__)
 
 @flask_app.route('/health')
 def health():
     return {"status": "healthy", "services": ["StockUpdateService", "OrderCreationService"]}
 
-@flask_app.route('/CentralServices', methods=['GET', 'POST'])
-def soap_endpoint():
-    environ = flask_request.environ
-    response_body = []
-    response_status = []
-    response_headers = []
-    def start_response(status, headers):
-        response_status.append(status)
-        response_headers.extend(headers)
-    result = wsgi_app(environ, start_response)
-    for data in result: response_body.append(data)
-    status_code = int(response_status[0].split(' ')[0]) if response_status else 200
-    resp = Response(b''.join(response_body), status=status_code)
-    for header, value in response_headers: resp.headers[header] = value
-    return resp
-
-if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 8000))
-    flask_app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+# SOAP uygulaması Flask route'u üzerinden sarmalanmadan doğrudan WSGI seviyesinde bağlanır
+flask_app.wsgi_app = DispatcherMiddleware(flask_app.wsgi_app, {'/CentralServices': wsgi_app})
\ No newline at end of file
@@ -128,6 +128,7 @@ class EventHubEventProducer:
             DEFAULT_EVENT_HUB_NAME
         )
         self.producer = None
+        self._batch = None
 
     def _is_placeholder_connection(self) -> bool:
         """Check if using placeholder connection string."""
@@ -156,16 +157,17 @@ class EventHubEventProducer:
 
     def send_event(self, event: dict) -> bool:
         """
-        Send a single event to Event Hub.
+        Queue a single event for Event Hub.
+
+        The event is added to the pending batch, which is sent when it fills
+        up or on flush()/close().
 
         Args:
             event: Event payload dictionary
 
         Returns:
-            bool: True if sent successfully (or simulated)
+            bool: True if queued successfully (or simulated)
         """
-        event_json = json.dumps(event, indent=2)
-
         print("\n" + "=" * 60)
         print("SENDING INVENTORY LOW EVENT")
         print("=" * 60)
@@ -180,24 +182,56 @@ class EventHubEventProducer:
 
         if self.producer is None:
             print("[SIMULATION MODE] Event would be sent to Azure Event Hubs:")
-            print(event_json)
+            print(json.dumps(event, indent=2))
             print("[SIMULATION] Event simulated successfully!")
             return True
 
         try:
-            # Create batch and add event
-            event_data_batch = self.producer.create_batch()
-            event_data_batch.add(EventData(json.dumps(event)))
-
-            # Send the batch
-            self.producer.send_batch(event_data_batch)
-            print(f"[SUCCESS] Event sent to Event Hub: {self.event_hub_name}")
+            self._add_to_batch(event)
+            print(f"[QUEUED] Event added to batch ({len(self._batch)} pending)")
             return True
 
         except Exception as e:
             print(f"[ERROR] Failed to send event: {e}")
             return False
 
+    def _add_to_batch(self, event: dict):
+        """Add an event to the pending batch, sending the batch first if it is full."""
+        event_data = EventData(json.dumps(event, separators=(",", ":")))
+        if self._batch is None:
+            # Events accumulate here and go out in as few AMQP sends as possible.
+            # Created on first use: create_batch() opens the link, so errors surface here.
+            self._batch = self.producer.create_batch()
+        try:
+            self._batch.add(event_data)
+        except ValueError:
+            # Batch reached max_size_in_bytes
+            if not self.flush():
+                raise RuntimeError("pending batch could not be sent")
+            self._batch = self.producer.create_batch()
+            self._batch.add(event_data)
+
+    def flush(self) -> bool:
+        """
+        Send the pending batch, if any.
+
+        Returns:
+            bool: True if sent successfully (or nothing was pending)
+        """
+        if self.producer is None or self._batch is None or len(self._batch) == 0:
+            return True
+
+        # The batch is only discarded once it has been sent; on failure it stays pending
+        try:
+            self.producer.send_batch(self._batch)
+            print(f"[SUCCESS] {len(self._batch)} events sent to Event Hub: {self.event_hub_name}")
+            self._batch = None
+            return True
+
+        except Exception as e:
+            print(f"[ERROR] Failed to send batch: {e}")
+            return False
+
     def send_batch(self, events: list) -> bool:
         """
         Send multiple events as a batch.
@@ -216,22 +250,19 @@ class EventHubEventProducer:
             return True
 
         try:
-            event_data_batch = self.producer.create_batch()
-
             for event in events:
-                event_data_batch.add(EventData(json.dumps(event)))
-
-            self.producer.send_batch(event_data_batch)
-            print(f"[SUCCESS] Batch of {len(events)} events sent successfully!")
-            return True
+                self._add_to_batch(event)
 
         except Exception as e:
             print(f"[ERROR] Failed to send batch: {e}")
             return False
 
+        return self.flush()
+
     def close(self):
-        """Close the producer connection."""
+        """Flush pending events and close the producer connection."""
         if self.producer:
+            self.flush()
             self.producer.close()
             print("[DISCONNECTED] Event Hub connection closed")
 
@@ -289,6 +320,7 @@ def run_simulation():
         producer.send_event(event1)
         producer.send_event(event2)
         producer.send_event(event3)
+        producer.flush()
 
         print("\n" + "=" * 60)
         print("SIMULATION COMPLETE")
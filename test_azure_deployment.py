@@ -1,25 +1,121 @@
 import asyncio
-import json
+import hashlib
+import os
+import orjson
 from azure.eventhub.aio import EventHubProducerClient
 from azure.eventhub import EventData, TransportType
+from azure.eventhub.exceptions import ConnectError
+from azure.core.credentials import AzureNamedKeyCredential
 
-# DİKKAT: Takım 1'den aldığınız anahtarı buraya yapıştırın
-CONNECTION_STR = "Endpoint=sb://medical-supply-chain-ns.servicebus.windows.net/;SharedAccessKeyName=RootManageSharedAccessKey;SharedAccessKey=HFDW05QKieWgy3uDKmNHc2OisPdrfNvoy+AEhKCJZlw=;TransportType=AmqpWebSockets"
-EVENT_HUB_NAME = "inventory-low-events"
+# uvloop (libuv tabanlı event loop) varsa onu kullan; Windows'ta yok, varsayılan loop'a düşer
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
-async def run():
-    # DÜZELTME: Sizin sürümünüze uygun olan ismi kullandık (AmqpOverWebsocket)
-    producer = EventHubProducerClient.from_connection_string(
-        conn_str=CONNECTION_STR, 
+# Azure AD kimliği (az login, Managed Identity vb.) için; yoksa yalnızca bağlantı dizesiyle çalışılır
+try:
+    from azure.identity.aio import DefaultAzureCredential
+except ImportError:
+    DefaultAzureCredential = None
+
+# Gizli anahtar kaynak kodda tutulmaz: bağlantı dizesi verilmezse DefaultAzureCredential kullanılır
+EVENT_HUB_CONNECTION_STRING = os.environ.get("EVENT_HUB_CONNECTION_STRING")
+EVENT_HUB_NAMESPACE = os.environ.get("EVENT_HUB_NAMESPACE", "medical-supply-chain-ns.servicebus.windows.net")
+EVENT_HUB_NAME = os.environ.get("EVENT_HUB_NAME", "inventory-low-events")
+
+def _parse_connection_str(conn_str):
+    # "Anahtar=Değer;..." biçimindeki SAS bağlantı dizesini (namespace, credential) olarak ayır
+    parts = dict(part.split("=", 1) for part in conn_str.split(";") if part)
+    namespace = parts["Endpoint"].split("://", 1)[-1].rstrip("/")
+    credential = AzureNamedKeyCredential(parts["SharedAccessKeyName"], parts["SharedAccessKey"])
+    return namespace, credential
+
+# Bağlantı dizesi modül yüklenirken bir kez ayrıştırılır; her producer doğrudan constructor ile kurulur
+if EVENT_HUB_CONNECTION_STRING:
+    FULLY_QUALIFIED_NAMESPACE, SAS_CREDENTIAL = _parse_connection_str(EVENT_HUB_CONNECTION_STRING)
+else:
+    FULLY_QUALIFIED_NAMESPACE, SAS_CREDENTIAL = EVENT_HUB_NAMESPACE, None
+
+# Varsayılan ham AMQP (5671); güvenlik duvarı engellerse WebSocket (443) kullanılır.
+# EVENTHUB_TRANSPORT=AmqpOverWebsocket ile doğrudan WebSocket seçilebilir
+EVENTHUB_TRANSPORT = os.environ.get("EVENTHUB_TRANSPORT", "Amqp")
+
+def _create_credential():
+    if SAS_CREDENTIAL is not None:
+        return SAS_CREDENTIAL
+    if DefaultAzureCredential is None:
+        raise RuntimeError("EVENT_HUB_CONNECTION_STRING tanımlı değil ve azure-identity kurulu değil")
+    return DefaultAzureCredential()
+
+def _create_producer(transport_type, credential):
+    return EventHubProducerClient(
+        fully_qualified_namespace=FULLY_QUALIFIED_NAMESPACE,
         eventhub_name=EVENT_HUB_NAME,
-        transport_type=TransportType.AmqpOverWebsocket
+        credential=credential,
+        transport_type=transport_type
     )
-    
-    async with producer:
-        event_batch = await producer.create_batch()
-        
-        # Test Verisi
-        test_data = {
+
+async def _open_producer():
+    # Bağlantı ilk create_batch() ile açılır; AMQP portu kapalıysa WebSocket'e düş
+    global _credential
+    if _credential is None:
+        _credential = _create_credential()
+    transport_type = TransportType[EVENTHUB_TRANSPORT]
+    producer = _create_producer(transport_type, _credential)
+    try:
+        await producer.create_batch()
+        return producer
+    except ConnectError:
+        await producer.close()
+        if transport_type is TransportType.AmqpOverWebsocket:
+            raise
+        print("⚠️ AMQP bağlantısı kurulamadı, AmqpOverWebsocket ile tekrar deneniyor...")
+        producer = _create_producer(TransportType.AmqpOverWebsocket, _credential)
+        await producer.create_batch()
+        return producer
+
+# Modül düzeyinde tek producer: SASL/CBS el sıkışması ve link attach yalnızca bir kez yapılır
+_producer = None
+_producer_opening = None
+_partition_ids = None
+# Producer'lar aynı credential'ı paylaşır; AAD token'ı süresi dolana kadar yeniden kullanılır
+_credential = None
+
+async def get_producer():
+    # Eşzamanlı ilk çağrılar aynı açılış görevini bekler (iki bağlantı açılmaz)
+    global _producer, _producer_opening
+    if _producer is None:
+        if _producer_opening is None:
+            _producer_opening = asyncio.ensure_future(_open_producer())
+        try:
+            _producer = await _producer_opening
+        finally:
+            _producer_opening = None
+    return _producer
+
+async def get_partition_ids():
+    # Partition listesi producer ömrü boyunca değişmez; management çağrısı bir kez yapılır
+    global _partition_ids
+    if _partition_ids is None:
+        producer = await get_producer()
+        _partition_ids = await producer.get_partition_ids()
+    return _partition_ids
+
+async def close_producer():
+    global _producer, _credential, _partition_ids
+    _partition_ids = None
+    if _producer is not None:
+        producer, _producer = _producer, None
+        await producer.close()
+    # DefaultAzureCredential kendi HTTP oturumlarını tutar; SAS credential'ın close'u yoktur
+    if _credential is not None:
+        credential, _credential = _credential, None
+        if hasattr(credential, "close"):
+            await credential.close()
+
+# Test Verisi
+TEST_DATA = {
     "hospitalId": "TEST-SERVERLESS-DB", # Farklı bir isim verelim ki tabloda hemen tanı
     "productCode": "TEST-URUN-999",
     "currentStockUnits": 5,             # Stok çok az
@@ -28,15 +124,67 @@ async def run():
     "threshold": 2.0,
     "timestamp": "2026-01-07T22:45:00"
 }
-        
-        print(f"Gönderiliyor: {test_data}")
-        event_batch.add(EventData(json.dumps(test_data)))
-        
+def encode_event(data):
+    # Olayı (partition anahtarı, gövde) çiftine çevirir; anahtar gövdeyle birlikte taşınır
+    return data["hospitalId"], orjson.dumps(data)
+
+# TEST_DATA sabit olduğundan bir kez serileştirilir; run() hazır çiftleri olduğu gibi gönderir
+TEST_DATA_EVENT = encode_event(TEST_DATA)
+
+def _partition_index(hospital_id, partition_count):
+    # Aynı hastanenin olayları her çağrıda aynı partition'a düşer (sıra korunur)
+    digest = hashlib.blake2b(hospital_id.encode(), digest_size=2).digest()
+    return int.from_bytes(digest, "big") % partition_count
+
+async def _send_partition(producer, partition_id, bodies):
+    # Olaylar aynı batch'te biriktirilir; batch boyut sınırına gelince gönderilip yenisi açılır
+    event_batch = await producer.create_batch(partition_id=partition_id)
+    for body in bodies:
+        event_data = EventData(body)
+        try:
+            event_batch.add(event_data)
+        except ValueError:
+            # Batch doldu: gönder, yenisine devam et
+            await producer.send_batch(event_batch)
+            event_batch = await producer.create_batch(partition_id=partition_id)
+            event_batch.add(event_data)
+
+    if len(event_batch):
         await producer.send_batch(event_batch)
-        print("✅ Veri Azure Event Hub'a başarıyla gönderildi!")
+
+async def run(events=None):
+    # events: gönderilecek olay dict'leri veya encode_event() çiftleri (verilmezse tek TEST_DATA).
+    if events is None:
+        events = (TEST_DATA_EVENT,)
+    # orjson doğrudan UTF-8 bytes üretir; EventData bytes kabul eder
+    keyed = [data if isinstance(data, tuple) else encode_event(data) for data in events]
+
+    producer = await get_producer()
+    partition_ids = await get_partition_ids()
+
+    # Olayları hospitalId'ye göre partition'lara dağıt; her partition'ın batch'leri paralel gönderilir
+    groups = {}
+    for hospital_id, body in keyed:
+        partition_id = partition_ids[_partition_index(hospital_id, len(partition_ids))]
+        groups.setdefault(partition_id, []).append(body)
+    await asyncio.gather(*(
+        _send_partition(producer, partition_id, group)
+        for partition_id, group in groups.items()
+    ))
+    print(f"✅ {len(keyed)} veri Azure Event Hub'a başarıyla gönderildi!")
+
+async def main():
+    # Producer'ı script sonunda (Ctrl+C ile iptal dahil) kapat
+    try:
+        await run()
+    finally:
+        await close_producer()
 
 if __name__ == '__main__':
     try:
-        asyncio.run(run())
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         pass
\ No newline at end of file
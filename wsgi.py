@@ -0,0 +1,7 @@
+"""
+WSGI entry point for the Central Warehouse SOAP service (Team 1)
+
+Run with: gunicorn -k gthread -w 4 --threads 16 --keep-alive 30 -b 0.0.0.0:8000 wsgi:application
+"""
+
+from real_soap_service import flask_app as application